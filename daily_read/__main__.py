@@ -93,6 +93,7 @@ def generate_all(ctx, upload=False, develop=False):
     modified_orders = op.process_orders(config_values.STATUS_PRIORITY_REV)
     daily_rep = daily_read.daily_report.DailyReport()
 
+    uploaded_projects = []
     for owner in modified_orders:
         if upload:
             report = daily_rep.populate_and_write_report(owner, modified_orders[owner], config_values.STATUS_PRIORITY)
@@ -104,9 +105,9 @@ def generate_all(ctx, upload=False, develop=False):
                         report_upload = report if upload_category == "projects" else ""
                         try:
                             request_success = op.upload_report_to_order_portal(report_upload, project, report_state)
-                            # Stage changes
+                            # Collect for staging
                             if request_success:
-                                op.projects_data.stage_data_for_project(project)
+                                uploaded_projects.append(project)
                         # catch any and every exception during upload
                         except Exception as e:
                             log.error(
@@ -122,7 +123,8 @@ def generate_all(ctx, upload=False, develop=False):
                 out_dir=config_values.REPORTS_LOCATION,
             )
     if upload:
-        # Commit all uploaded projects
+        # Stage and commit all uploaded projects
+        op.projects_data.stage_data_for_projects(uploaded_projects)
         op.projects_data.commit_staged_data(f"Commit reports updates for {datetime.datetime.now()}")
 
     daily_read.utils.error_reporting(log)
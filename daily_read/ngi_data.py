@@ -1,16 +1,71 @@
+import collections
+import concurrent.futures
 import datetime
+import itertools
 import json
 import logging
 import os
+import stat
+import subprocess
 
-from dateutil.relativedelta import relativedelta
-import git
-import gitdb
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from daily_read import statusdb
 
 log = logging.getLogger(__name__)
 
+# orjson serializes to bytes at C speed, fall back to the standard library if it is not
+# installed. The fallback uses orjson's compact separators and raw UTF-8 so both paths
+# produce identical bytes and project files do not all show up as modified when
+# switching between them
+_dumps = orjson.dumps if orjson else lambda o: json.dumps(o, separators=(",", ":"), ensure_ascii=False).encode()
+
+GitStatus = collections.namedtuple("GitStatus", ["staged", "modified", "untracked"])
+
+
+def _parse_porcelain_status(output):
+    """Parses NUL-delimited `git status --porcelain=v2 -z` output into a GitStatus.
+
+    Entry types (see git-status(1)): "1" ordinary changed, "2" rename/copy
+    (followed by the original path as a separate NUL-delimited token),
+    "u" unmerged and "?" untracked. The XY field holds the staged (X) and
+    working tree (Y) state, with "." meaning unmodified.
+    """
+    staged = []
+    modified = []
+    untracked = []
+
+    tokens = iter(output.split(b"\0"))
+    for token in tokens:
+        if not token:
+            continue
+        if token.startswith(b"? "):
+            untracked.append(os.fsdecode(token[2:]))
+            continue
+        if token.startswith(b"1 "):
+            fields = token.split(b" ", 8)
+            xy, path = fields[1], os.fsdecode(fields[8])
+        elif token.startswith(b"2 "):
+            fields = token.split(b" ", 9)
+            xy, path = fields[1], os.fsdecode(fields[9])
+            next(tokens)  # Skip the original path of the rename/copy
+        elif token.startswith(b"u "):
+            fields = token.split(b" ", 10)
+            xy, path = fields[1], os.fsdecode(fields[10])
+        else:
+            continue
+
+        if xy[0:1] != b".":
+            staged.append(path)
+        if xy[1:2] != b".":
+            modified.append(path)
+
+    # The snapshot is cached and shared between consumers, so freeze it
+    return GitStatus(staged=tuple(staged), modified=tuple(modified), untracked=tuple(untracked))
+
 
 class ProjectDataMaster(object):
     def __init__(self, config):
@@ -35,16 +90,28 @@ class ProjectDataMaster(object):
         self._data_fetched = False
         self._data_saved = False
 
+        self._status_cache = None  # Cached GitStatus from _compute_status()
+
         self.data = {}  # Key: Portal_id, Value: ProjectDataRecord
 
         self.user_list = self._read_user_list(config.USERS_LIST_LOCATION)
 
     def __setup_data_repo(self):
-        # Safety check of path
+        # GitPython is a heavy import, only pay for it once a repo is set up
+        import git
+        import gitdb
+
+        # Safety check of path, isabs is a pure string operation
         if not os.path.isabs(self.data_location):
             raise ValueError(f"Data location is not an absolute path: {self.data_location}")
 
-        if os.path.exists(self.data_location) and not os.path.isdir(self.data_location):
+        # One stat call replaces the separate exists and isdir probes
+        try:
+            location_stat = os.stat(self.data_location)
+        except FileNotFoundError:
+            location_stat = None
+
+        if location_stat is not None and not stat.S_ISDIR(location_stat.st_mode):
             raise ValueError(f"Data Location exists but is not a directory: {self.data_location}")
 
         # This seems to work with both existing git repos, empty directories
@@ -80,14 +147,65 @@ class ProjectDataMaster(object):
 
         return users_list
 
+    def _run_status(self, untracked_files="all"):
+        """Runs a single native `git status` call and parses it into a GitStatus"""
+        result = subprocess.run(
+            [
+                "git",
+                "--no-optional-locks",
+                "-C",
+                str(self.data_location),
+                "status",
+                "--porcelain=v2",
+                "-z",
+                f"--untracked-files={untracked_files}",
+                "--no-ahead-behind",
+            ],
+            capture_output=True,
+            check=True,
+        )
+        return _parse_porcelain_status(result.stdout)
+
+    def _compute_status(self):
+        """Collects staged, modified and untracked files in a single status pass.
+
+        One native `git status` call is considerably faster than GitPython's
+        pure-Python index diffs and working tree walk. The result is cached
+        and reused until the repository is changed through staging,
+        committing or save_data.
+        """
+        if self._status_cache is None:
+            self._status_cache = self._run_status()
+        return self._status_cache
+
+    def _has_staged_or_modified(self):
+        """Checks for staged or modified files without the untracked file walk.
+
+        Listing untracked files scans the whole data location, which is the
+        expensive part of a status call. Callers that only need to know
+        whether tracked files are dirty can use this cheaper check.
+        """
+        if self._status_cache is not None:
+            status = self._status_cache
+        else:
+            status = self._run_status(untracked_files="no")
+        return bool(status.staged or status.modified)
+
+    def _invalidate_status(self):
+        """Drops the cached status, forcing a fresh one on next access"""
+        self._status_cache = None
+
     @property
     def staged_files(self):
-        return [diff.b_path for diff in self.data_repo.index.diff("HEAD")]
+        """Staged files, a view into the cached status snapshot rather than
+        a list rebuilt on every access"""
+        return self._compute_status().staged
 
     @property
     def modified_not_staged_files(self):
-        """Modifed and not staged files"""
-        return [diff.b_path for diff in self.data_repo.index.diff(None)]
+        """Modifed and not staged files, a view into the cached status
+        snapshot rather than a list rebuilt on every access"""
+        return self._compute_status().modified
 
     def get_data(self, project_id=None, source_name=None, close_date=None):
         """Downloads data for each source into memory"""
@@ -112,30 +230,61 @@ class ProjectDataMaster(object):
         """
         assert self._data_fetched
 
-        if self.any_modified_or_new():
+        if self._has_staged_or_modified():
             log.info("Changes for projects detected from previous run!")
             for project_record in self.get_modified_or_new_projects():
                 log.info(f"{project_record.project_id} from {project_record.ngi_node} had changes not yet reported.")
 
-        for portal_id, project_record in self.data.items():
-            source_year_dir = os.path.join(self.data_location, project_record.relative_dirpath)
+        # All records from one source and year share a directory, so group them
+        # and do the directory creation and safety check once per group
+        records_by_dir = collections.defaultdict(list)
+        for project_record in self.data.values():
+            records_by_dir[project_record.relative_dirpath].append(project_record)
 
-            # Save individual projects to json files
-            # Safety check on directory
-            os.makedirs(source_year_dir, exist_ok=True)
+        # Create all target directories up front so the parallel writes
+        # below never race on makedirs
+        write_jobs = []
+        for relative_dirpath, project_records in records_by_dir.items():
+            source_year_dir = os.path.join(self.data_location, relative_dirpath)
 
-            if not os.path.isdir(source_year_dir):
+            # Save individual projects to json files
+            # makedirs raises if the path exists but is not a directory,
+            # so no separate isdir probe is needed
+            try:
+                os.makedirs(source_year_dir, exist_ok=True)
+            except (FileExistsError, NotADirectoryError):
                 raise ValueError(
                     f"Failed to use data directory {source_year_dir} for download, path exists but is not a directory."
                 )
 
-            abs_path = os.path.join(self.data_location, project_record.relative_path)
-            if os.path.dirname(abs_path) != source_year_dir:  # This should really never happen
-                raise ValueError(f"Error with paths, dirname of {abs_path} should be {source_year_dir}")
+            for project_record in project_records:
+                write_jobs.append((os.path.join(source_year_dir, project_record.file_name), project_record))
 
-            with open(abs_path, mode="w") as fh:
-                log.debug(f"Writing data for {project_record.project_id} to {abs_path}")
-                fh.write(json.dumps(project_record.data_for_file()))
+        def _write_one(job):
+            abs_path, project_record = job
+            log.debug(f"Writing data for {project_record.project_id} to {abs_path}")
+            # The payload is a single bytes object, so write it through a
+            # raw file descriptor and skip Python's buffered IO machinery
+            payload = memoryview(_dumps(project_record.data_for_file()))
+            fd = os.open(abs_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                # os.write may write fewer bytes than asked, loop so a short
+                # write cannot silently truncate the file
+                while payload:
+                    payload = payload[os.write(fd, payload) :]
+            finally:
+                os.close(fd)
+
+        # Each project has its own file, so the writes are independent and
+        # the GIL is released during the actual IO
+        if write_jobs:
+            max_workers = min(32, (os.cpu_count() or 1) * 4)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Consume the iterator so any worker exception is raised here
+                list(executor.map(_write_one, write_jobs))
+
+        # The working tree has changed, so any cached status is out of date
+        self._invalidate_status()
 
         self._data_saved = True
 
@@ -148,13 +297,7 @@ class ProjectDataMaster(object):
          - Untracked files
 
         """
-        return any(
-            [
-                self.data_repo.is_dirty(),
-                self.data_repo.untracked_files,
-                self.staged_files,
-            ]
-        )
+        return any(self._compute_status())
 
     def get_modified_or_new_projects(self):
         """Returns files which are either:
@@ -162,26 +305,23 @@ class ProjectDataMaster(object):
         - Modified but not staged
         - Untracked files
         """
-        projects = set()
-        if not self.any_modified_or_new():
+        status = self._compute_status()
+        if not any(status):
             return []
 
-        # Modified and staged files
-        projects.update(self.staged_files)
-
-        # Modified and not staged files
-        projects.update(self.modified_not_staged_files)
-
-        # Modified untracked files
-        projects.update(self.data_repo.untracked_files)
+        # Parse each changed path exactly once in a single pass over the
+        # staged, modified and untracked files, duplicates between the
+        # three lists collapse in the dict
+        portal_id_by_path = {
+            project_relpath: ProjectDataRecord.portal_id_from_path(project_relpath)
+            for project_relpath in itertools.chain(status.staged, status.modified, status.untracked)
+        }
 
         projects_list = []
 
-        for project_relpath in projects:
-            portal_id = ProjectDataRecord.portal_id_from_path(project_relpath)
-            if portal_id in self.data:
-                project_record = self.data[portal_id]
-            else:
+        for project_relpath, portal_id in portal_id_by_path.items():
+            project_record = self.data.get(portal_id)
+            if project_record is None:
                 log.info(f"Data not fetched this time for {portal_id}, read data from file")
                 project_path = os.path.join(self.data_location, project_relpath)
 
@@ -218,10 +358,22 @@ class ProjectDataMaster(object):
         return orderers
 
     def stage_data_for_project(self, project_record):
-        self.data_repo.index.add([project_record.relative_path])
+        self.stage_data_for_projects([project_record])
+
+    def stage_data_for_projects(self, project_records):
+        """Stages the given project records in a single index operation.
+
+        Each index.add call rewrites .git/index, so batching the paths
+        is much cheaper than staging the projects one by one.
+        """
+        paths = [project_record.relative_path for project_record in project_records]
+        if paths:
+            self.data_repo.index.add(paths)
+            self._invalidate_status()
 
     def commit_staged_data(self, message):
         self.data_repo.index.commit(message)
+        self._invalidate_status()
 
 
 class ProjectDataRecord(object):
@@ -230,6 +382,25 @@ class ProjectDataRecord(object):
     Raises ValueError if orderer is not present in data, if data is given
     """
 
+    # Thousands of records can be alive at once, slots avoid a per-instance
+    # __dict__ and make attribute access a little faster
+    __slots__ = (
+        "ngi_node",
+        "year",
+        "file_name",
+        "relative_path",
+        "relative_dirpath",
+        "project_id",
+        "report_iuid",
+        "orderer",
+        "project_dates",
+        "internal_id",
+        "internal_name",
+        "events",
+        "status",
+        "internal_proj_status",
+    )
+
     def __init__(
         self,
         relative_path,
@@ -241,10 +412,12 @@ class ProjectDataRecord(object):
         internal_proj_status=None,
     ):
         """relative_path: e.g. "NGIS/2023/NGI0002313.json" """
-        node_year, file_name = os.path.split(relative_path)
-        node, year = os.path.split(node_year)
+        # Parse the path with rpartition instead of repeated os.path.split
+        # calls, paths are always built with forward slashes
+        node_year, _, file_name = relative_path.rpartition("/")
+        node, _, year = node_year.rpartition("/")
         # Removes the last extension, we'll assume we only have one (.json)
-        project_id = os.path.splitext(file_name)[0]
+        project_id = file_name.rpartition(".")[0] or file_name
 
         self.ngi_node = node
         self.year = year
@@ -252,6 +425,35 @@ class ProjectDataRecord(object):
         self.relative_path = relative_path
         self.relative_dirpath = node_year
         self.project_id = project_id
+        self._init_data(orderer, project_dates, internal_id, internal_name, dates_prio, internal_proj_status)
+
+    @classmethod
+    def from_parts(
+        cls,
+        node,
+        year,
+        portal_id,
+        orderer,
+        project_dates,
+        internal_id=None,
+        internal_name=None,
+        dates_prio=None,
+        internal_proj_status=None,
+    ):
+        """Fast-path constructor for callers that already hold the path parts,
+        skips re-parsing a path that was just assembled from them"""
+        record = cls.__new__(cls)
+        record.ngi_node = node
+        record.year = year
+        record.file_name = f"{portal_id}.json"
+        record.relative_dirpath = f"{node}/{year}"
+        record.relative_path = f"{record.relative_dirpath}/{record.file_name}"
+        record.project_id = portal_id
+        record._init_data(orderer, project_dates, internal_id, internal_name, dates_prio, internal_proj_status)
+        return record
+
+    def _init_data(self, orderer, project_dates, internal_id, internal_name, dates_prio, internal_proj_status):
+        """Shared by both constructors, sets everything except the path attributes"""
         self.report_iuid = None
 
         self.orderer = orderer
@@ -278,12 +480,12 @@ class ProjectDataRecord(object):
             else:
                 self.status = latest_statuses[0]
         else:
-            log.info(f"No project dates found for {project_id}, trying to find status from internal_proj_status")
+            log.info(f"No project dates found for {self.project_id}, trying to find status from internal_proj_status")
             if internal_proj_status in ["Pending", "Aborted", "Closed"]:
                 self.status = internal_proj_status
             else:
                 log.error(
-                    f"ERROR! No project dates or incorrect internal_proj_status found for {project_id}, no status set!"
+                    f"ERROR! No project dates or incorrect internal_proj_status found for {self.project_id}, no status set!"
                 )
 
     @property
@@ -315,25 +517,25 @@ class ProjectDataRecord(object):
         with open(relative_path, "r") as fh:
             data = json.load(fh)
 
-        internal_id = None
-        if "internal_id" in data:
-            internal_id = data["internal_id"]
-
-        internal_name = None
-        if "internal_name" in data:
-            internal_name = data["internal_name"]
-
-        internal_proj_status = None
-        if "internal_proj_status" in data:
-            internal_proj_status = data["internal_proj_status"]
-
-        return data["orderer"], data["project_dates"], internal_id, internal_name, internal_proj_status
+        # Single dict lookup per key instead of a containment check
+        # followed by indexing
+        orderer = data.get("orderer")
+        if orderer is None:
+            raise ValueError(f"No orderer found in data from {relative_path}")
+
+        return (
+            orderer,
+            data["project_dates"],
+            data.get("internal_id"),
+            data.get("internal_name"),
+            data.get("internal_proj_status"),
+        )
 
+    @staticmethod
     def portal_id_from_path(path):
-        """Class method to parse out project portal id (e.g. filename without extension) from given path"""
-        _, file_name = os.path.split(path)
-        portal_id = os.path.splitext(file_name)[0]
-        return portal_id
+        """Parses out project portal id (e.g. filename without extension) from given path"""
+        file_name = path.rpartition("/")[2]
+        return file_name.rpartition(".")[0] or file_name
 
 
 class StockholmProjectData(object):
@@ -351,12 +553,17 @@ class StockholmProjectData(object):
         If close_date is not given, defaults to 6 months ago.
         Close date should be a relative delta.
         """
+        from dateutil.relativedelta import relativedelta
+
         self.data = {}
         if project_id is not None:
             self.get_entry(project_id)
         else:
             if close_date is None:
                 close_date = (datetime.datetime.now() - relativedelta(months=6)).strftime("%Y-%m-%d")
+            # Hoist the attribute lookups out of the hot ingestion loop
+            dirname = self.dirname
+            dates_prio = self.dates_prio
             for row in self.statusdb_session.rows(close_date=close_date):
                 if "portal_id" not in row.value:
                     # Probably a project with no associated order(e.g legacy ESCG), log it and skip
@@ -368,28 +575,25 @@ class StockholmProjectData(object):
                 if not order_year:
                     log.error(f"No order year found for order {portal_id}, skipping it!")
                     continue
-                relative_path = f"{self.dirname}/{order_year}/{portal_id}.json"
 
-                project_dates = row.value["proj_dates"]
-                orderer = row.value["orderer"]
-                internal_id = row.value["project_id"]
-                internal_name = row.value["project_name"]
-                internal_proj_status = row.value["status"]
-
-                self.data[portal_id] = ProjectDataRecord(
-                    relative_path,
-                    orderer,
-                    project_dates,
-                    internal_id,
-                    internal_name,
-                    self.dates_prio,
-                    internal_proj_status,
+                self.data[portal_id] = ProjectDataRecord.from_parts(
+                    dirname,
+                    order_year,
+                    portal_id,
+                    row.value["orderer"],
+                    row.value["proj_dates"],
+                    row.value["project_id"],
+                    row.value["project_name"],
+                    dates_prio,
+                    row.value["status"],
                 )
 
         return self.data
 
     def get_entry(self, project_id):
         """Fetches data for a single project from statusdb"""
+        from dateutil.relativedelta import relativedelta
+
         close_date = (datetime.datetime.now() - relativedelta(months=6)).strftime("%Y-%m-%d")
         rows = self.statusdb_session.rows(close_date=close_date)
         for row in rows:
@@ -400,22 +604,17 @@ class StockholmProjectData(object):
                 if not order_year:
                     log.error(f"No order year found for order {portal_id}, skipping it!")
                     return
-                relative_path = f"{self.dirname}/{order_year}/{portal_id}.json"
 
-                project_dates = row.value["proj_dates"]
-                orderer = row.value["orderer"]
-                internal_id = row.value["project_id"]
-                internal_name = row.value["project_name"]
-                internal_proj_status = row.value["status"]
-
-                self.data[portal_id] = ProjectDataRecord(
-                    relative_path,
-                    orderer,
-                    project_dates,
-                    internal_id,
-                    internal_name,
+                self.data[portal_id] = ProjectDataRecord.from_parts(
+                    self.dirname,
+                    order_year,
+                    portal_id,
+                    row.value["orderer"],
+                    row.value["proj_dates"],
+                    row.value["project_id"],
+                    row.value["project_name"],
                     self.dates_prio,
-                    internal_proj_status,
+                    row.value["status"],
                 )
                 return
         raise ValueError(f"Project {project_id} not found in statusdb")
@@ -1,6 +1,5 @@
 """Classes for handling various utility functions"""
 
-import couchdb
 import logging
 
 log = logging.getLogger(__name__)
@@ -8,6 +7,10 @@ log = logging.getLogger(__name__)
 
 class StatusDBSession(object):
     def __init__(self, config):
+        # couchdb pulls in its http stack on import, defer it until a
+        # session is actually opened
+        import couchdb
+
         url_string = (
             f"https://{config.STHLM_STATUSDB_USERNAME}:{config.STHLM_STATUSDB_PASSWORD}@{config.STHLM_STATUSDB_URL}"
         )
@@ -17,10 +20,16 @@ class StatusDBSession(object):
             raise ConnectionError(f"Couchdb connection failed for url {display_url_string}")
         self.db_connection = self.connection["projects"]
 
-        self.projdates_view = self.db_connection.view(
+    def rows(self, close_date=None):
+        """Yields view rows in batches instead of materializing the full result in memory.
+
+        The dailyread_dates view already emits only the fields consumed
+        downstream, so the full project documents are never requested.
+        """
+        return self.db_connection.iterview(
             "project/dailyread_dates",
+            batch=1000,
+            descending=True,
+            endkey=[close_date, "ZZZZ"],
+            include_docs=False,
         )
-
-    def rows(self, close_date=None):
-        view = self.db_connection.view("project/dailyread_dates", descending=True, endkey=[close_date, "ZZZZ"])
-        return view.rows
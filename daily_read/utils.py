@@ -1,6 +1,8 @@
 """Module for common utility functions"""
 
+import functools
 import logging
+import os
 import subprocess
 import sys
 
@@ -17,18 +19,98 @@ class ContextFilter(logging.Filter):
         return True
 
 
+def _find_git_dir():
+    """Finds the git directory by walking up from the current directory,
+    mirroring how git itself resolves the repository"""
+    path = os.getcwd()
+    while True:
+        git_dir = os.path.join(path, ".git")
+        if os.path.isdir(git_dir):
+            return git_dir
+        if os.path.isfile(git_dir):
+            # Linked worktrees and submodules have a .git file that
+            # points at the real git directory
+            with open(git_dir, "r") as fh:
+                pointer = fh.read().strip()
+            if not pointer.startswith("gitdir: "):
+                raise ValueError(f"Unexpected content in git pointer file {git_dir}")
+            pointed = pointer[len("gitdir: ") :]
+            if not os.path.isabs(pointed):
+                pointed = os.path.normpath(os.path.join(path, pointed))
+            return pointed
+        parent = os.path.dirname(path)
+        if parent == path:
+            raise FileNotFoundError("No .git directory found")
+        path = parent
+
+
+def _resolve_ref(git_dir, ref):
+    """Resolves a ref to a sha from its loose ref file or packed-refs,
+    returns None if the ref is not found in this git directory"""
+    try:
+        with open(os.path.join(git_dir, ref), "r") as fh:
+            return fh.read().strip()
+    except FileNotFoundError:
+        pass
+    try:
+        with open(os.path.join(git_dir, "packed-refs"), "r") as fh:
+            for line in fh:
+                if line.startswith(("#", "^")):
+                    continue
+                sha, _, ref_name = line.strip().partition(" ")
+                if ref_name == ref:
+                    return sha
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def _read_git_head():
+    """Reads the current commit sha from .git/HEAD without spawning git"""
+    git_dir = _find_git_dir()
+
+    with open(os.path.join(git_dir, "HEAD"), "r") as fh:
+        head = fh.read().strip()
+
+    if not head.startswith("ref: "):
+        # Detached HEAD, the file holds the sha directly
+        return head
+
+    ref = head[len("ref: ") :]
+    sha = _resolve_ref(git_dir, ref)
+    if sha is None:
+        # Linked worktrees keep their refs in the common git directory
+        with open(os.path.join(git_dir, "commondir"), "r") as fh:
+            common_dir = fh.read().strip()
+        if not os.path.isabs(common_dir):
+            common_dir = os.path.normpath(os.path.join(git_dir, common_dir))
+        sha = _resolve_ref(common_dir, ref)
+    if sha is None:
+        raise FileNotFoundError(f"Could not resolve {ref} in {git_dir}")
+    return sha
+
+
+@functools.lru_cache(maxsize=1)
 def get_git_commits():
+    """The commit is constant for the lifetime of the process, so the result
+    is cached to avoid spawning git for every log record"""
     git_commits = {}
     try:
-        git_commits["git_commit"] = (
-            subprocess.check_output(["git", "rev-parse", "--short=7", "HEAD"]).decode(sys.stdout.encoding).strip()
-        )
-        git_commits["git_commit_full"] = (
-            subprocess.check_output(["git", "rev-parse", "HEAD"]).decode(sys.stdout.encoding).strip()
-        )
-    except:
-        git_commits["git_commit"] = "unknown"
-        git_commits["git_commit_full"] = "unknown"
+        full_sha = _read_git_head()
+        git_commits["git_commit"] = full_sha[:7]
+        git_commits["git_commit_full"] = full_sha
+    except Exception:
+        # Fall back to spawning git if .git could not be read directly
+        try:
+            git_commits["git_commit"] = (
+                subprocess.check_output(["git", "rev-parse", "--short=7", "HEAD"]).decode(sys.stdout.encoding).strip()
+            )
+            git_commits["git_commit_full"] = (
+                subprocess.check_output(["git", "rev-parse", "HEAD"]).decode(sys.stdout.encoding).strip()
+            )
+        except:
+            git_commits["git_commit"] = "unknown"
+            git_commits["git_commit_full"] = "unknown"
     return git_commits
 
 
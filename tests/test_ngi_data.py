@@ -9,6 +9,44 @@ from daily_read import ngi_data, config
 ####################################################### TESTS #########################################################
 
 
+def test_parse_porcelain_status():
+    """Test parsing of `git status --porcelain=v2 -z` output into GitStatus buckets"""
+    output = (
+        b"1 .M N... 100644 100644 100644 aaaa bbbb NGIS/2023/mod file.json\x00"
+        b"1 A. N... 000000 100644 100644 0000 cccc NGIS/2023/staged.json\x00"
+        b"2 R. N... 100644 100644 100644 dddd eeee R100 NGIS/2023/new name.json\x00NGIS/2023/old name.json\x00"
+        b"u UU N... 100644 100644 100644 100644 ffff gggg hhhh NGIS/2023/conflict.json\x00"
+        b"? NGIS/2023/untracked file.json\x00"
+    )
+    status = ngi_data._parse_porcelain_status(output)
+
+    # Unmerged entries are dirty in both the index and the working tree
+    assert status.staged == ("NGIS/2023/staged.json", "NGIS/2023/new name.json", "NGIS/2023/conflict.json")
+    assert status.modified == ("NGIS/2023/mod file.json", "NGIS/2023/conflict.json")
+    assert status.untracked == ("NGIS/2023/untracked file.json",)
+
+    # The rename origin path is metadata, not a changed file
+    for bucket in status:
+        assert "NGIS/2023/old name.json" not in bucket
+
+
+def test_parse_porcelain_status_empty():
+    """Test parsing of an empty status output, i.e. a clean repository"""
+    status = ngi_data._parse_porcelain_status(b"")
+    assert status == ngi_data.GitStatus(staged=(), modified=(), untracked=())
+
+
+def test_modified_or_new_renamed(data_repo_tracked, get_env_file_path):
+    """Test that a staged rename is reported as a change"""
+    config_values = config.Config(get_env_file_path)
+    data_repo_tracked.index.move(["SNPSEQ/2022/tracked_file1.json", "SNPSEQ/2022/renamed_file1.json"])
+    with mock.patch("daily_read.statusdb.StatusDBSession"):
+        data_master = ngi_data.ProjectDataMaster(config_values)
+
+    assert data_master.any_modified_or_new()
+    assert "SNPSEQ/2022/renamed_file1.json" in data_master.staged_files
+
+
 def test_create_project_data_master(data_repo_full, get_env_file_path):
     """With existing git repo, test creation of a ProjectDataMaster class"""
     config_values = config.Config(get_env_file_path)
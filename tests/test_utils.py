@@ -1,4 +1,7 @@
 import logging
+import os
+
+import git
 import pytest
 
 from daily_read import utils
@@ -7,6 +10,65 @@ daily_read_module_name = "tests"
 log = logging.getLogger(daily_read_module_name)
 
 
+@pytest.fixture
+def commit_repo(tmp_path):
+    """A git repository with a single commit"""
+    repo = git.Repo.init(tmp_path)
+    new_file_path = os.path.join(tmp_path, "some_file.txt")
+    open(new_file_path, "a").close()
+    repo.index.add([new_file_path])
+    repo.index.commit("First commit")
+    return repo
+
+
+def test_read_git_head_symbolic_ref(commit_repo, monkeypatch):
+    """Test reading the commit sha when HEAD is a symbolic ref to a loose ref file"""
+    monkeypatch.chdir(commit_repo.working_dir)
+    assert utils._read_git_head() == commit_repo.head.commit.hexsha
+
+
+def test_read_git_head_from_subdir(commit_repo, monkeypatch):
+    """Test that the .git directory is found by walking up from a subdirectory"""
+    subdir = os.path.join(commit_repo.working_dir, "sub", "dir")
+    os.makedirs(subdir)
+    monkeypatch.chdir(subdir)
+    assert utils._read_git_head() == commit_repo.head.commit.hexsha
+
+
+def test_read_git_head_detached(commit_repo, monkeypatch):
+    """Test reading the commit sha from a detached HEAD"""
+    commit_repo.git.checkout(commit_repo.head.commit.hexsha)
+    monkeypatch.chdir(commit_repo.working_dir)
+    assert utils._read_git_head() == commit_repo.head.commit.hexsha
+
+
+def test_read_git_head_packed_refs(commit_repo, monkeypatch):
+    """Test reading the commit sha when the ref only exists in packed-refs"""
+    commit_repo.git.pack_refs("--all", "--prune")
+    monkeypatch.chdir(commit_repo.working_dir)
+    assert utils._read_git_head() == commit_repo.head.commit.hexsha
+
+
+def test_read_git_head_worktree(commit_repo, tmp_path_factory, monkeypatch):
+    """Test reading the commit sha from a linked worktree, where .git is a
+    pointer file and must not be skipped in favour of an outer repository"""
+    worktree_path = tmp_path_factory.mktemp("worktree")
+    commit_repo.git.worktree("add", str(worktree_path), "-b", "worktree_branch")
+    monkeypatch.chdir(worktree_path)
+    assert os.path.isfile(os.path.join(worktree_path, ".git"))
+    assert utils._read_git_head() == commit_repo.head.commit.hexsha
+
+
+def test_get_git_commits_outside_repo(tmp_path, monkeypatch):
+    """Test the unknown fallback when running outside any git repository"""
+    monkeypatch.chdir(tmp_path)
+    utils.get_git_commits.cache_clear()
+    try:
+        assert utils.get_git_commits() == {"git_commit": "unknown", "git_commit_full": "unknown"}
+    finally:
+        utils.get_git_commits.cache_clear()
+
+
 def test_error_reporting_without_error():
     """Test that no error is raised when the log has no error messages"""
     log.info("Test info")